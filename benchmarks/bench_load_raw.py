@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# eurogastp - Python tools for analyzing the European gas system
+#
+# Copyright notice
+# ----------------
+#
+# Copyright (C) 2022 European Union
+#
+# Licensed under the EUPL, Version 1.2 or – as soon they will be approved by
+# the European Commission – subsequent versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# https://joinup.ec.europa.eu/software/page/eupl5
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# Licence for the specific language governing permissions and limitations under
+# the Licence.
+#
+"""Benchmark of load_raw() for a growing number of raw data files.
+
+Writes N synthetic CSV raw files (same columns as the files downloaded by
+download_entsog_tp() with file_format='csv') into a temporary directory for
+each N and times load_raw() on them. The time per file should stay roughly
+constant as N grows (linear scaling); a time per file growing with N means
+that the data is concatenated step by step again (quadratic run time).
+
+Usage (from the root folder of the repository):
+
+    python benchmarks/bench_load_raw.py [N ...] [--rows ROWS] [--workers W]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from eurogastp import entsog  # noqa: E402
+
+
+def synthetic_raw(rows, seed=0):
+    """Return a DataFrame with *rows* records in the format of the ENTSOG TP
+    CSV files (one day per record, several point directions).
+    """
+    rng = np.random.default_rng(seed)
+    days = pd.Timestamp('2022-01-01 06:00') + pd.to_timedelta(
+        np.arange(rows) % 365, unit='D')
+    points = rng.integers(0, 50, rows)
+    return pd.DataFrame({
+        'indicator': 'Physical Flow',
+        'periodFrom': days.strftime('%Y-%m-%dT%H:%M:%S'),
+        'periodTo': (days + pd.Timedelta(days=1)).strftime(
+            '%Y-%m-%dT%H:%M:%S'),
+        'operatorKey': [f'DE-TSO-{p % 10:04d}' for p in points],
+        'operatorLabel': [f'Operator {p % 10}' for p in points],
+        'pointKey': [f'ITP-{p:05d}' for p in points],
+        'pointLabel': [f'Point {p}' for p in points],
+        'directionKey': np.where(points % 2, 'entry', 'exit'),
+        'value': rng.uniform(0, 1e8, rows).round(),
+        'lastUpdateDateTime': '2022-12-31T10:00:00',
+    })
+
+
+def write_files(dir_name, n, rows):
+    """Write *n* synthetic CSV raw files with *rows* records each into the
+    subfolder 2022 of *dir_name*.
+    """
+    year_dir = os.path.join(dir_name, '2022')
+    os.makedirs(year_dir)
+    for i in range(n):
+        synthetic_raw(rows, seed=i).to_csv(
+            os.path.join(year_dir, f'Physical_Flow_{i:05d}.csv'), index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('n', nargs='*', type=int, default=[50, 100, 200, 400],
+                        help='numbers of files (default: 50 100 200 400)')
+    parser.add_argument('--rows', type=int, default=2000,
+                        help='records per file (default: 2000)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='workers passed to load_raw() (default: 1)')
+    args = parser.parse_args(argv)
+    print(f'{"files":>6} {"rows":>9} {"time [s]":>9} {"ms/file":>8}')
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.n:
+            dir_name = os.path.join(tmp, str(n))
+            write_files(dir_name, n, args.rows)
+            t0 = time.perf_counter()
+            raw = entsog.load_raw(dir_name, dir_name2=None,
+                                  workers=args.workers)
+            elapsed = time.perf_counter() - t0
+            assert len(raw) == n * args.rows
+            print(f'{n:>6} {len(raw):>9} {elapsed:>9.2f} '
+                  f'{1000 * elapsed / n:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# eurogastp - Python tools for analyzing the European gas system
+#
+# Copyright notice
+# ----------------
+#
+# Copyright (C) 2022 European Union
+#
+# Licensed under the EUPL, Version 1.2 or – as soon they will be approved by
+# the European Commission – subsequent versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# https://joinup.ec.europa.eu/software/page/eupl5
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# Licence for the specific language governing permissions and limitations under
+# the Licence.
+#
+"""Persistent cache of periodized data, allowing to take the series whose
+raw data has not changed from previous runs instead of periodizing them
+again.
+"""
+
+import os
+import pickle
+import tempfile
+
+
+class PeriodizedCache:
+    """Cache of periodized data, kept in a directory with one file (pickle)
+    per start date of the period of interest.
+
+    For every start date, the file holds the end date of the cached period
+    of interest, the periodized data in long format, the keys (indicator,
+    operatorKey, pointKey, directionKey) of the series in the order of the
+    periodized data, and a fingerprint of the raw data of every series. For
+    the same period of interest, a series can be taken from the cache if
+    the fingerprint of its raw data is unchanged. For a period of interest
+    that ends later (e.g. the daily update up to the current day), the days
+    of a series up to shortly before the old end date are taken from the
+    cache if its raw data up to the old end date is unchanged and the new
+    records only follow the cached ones; only the remaining days are
+    periodized again. Cached data is not used for raw data with other
+    columns than the cached one.
+
+    Parameters:
+
+        dir_name : directory holding the cache files; it is created if it
+                   does not yet exist
+    """
+
+    def __init__(self, dir_name):
+        self.dir_name = dir_name
+
+    def _filename(self, start_date):
+        return os.path.join(self.dir_name, 'perd_{}.pkl'.format(
+            start_date.isoformat()))
+
+    def load(self, start_date):
+        """Return the cached data for the period of interest starting at
+        *start_date* as dictionary with the items 'end_date' (end of the
+        cached period of interest), 'perd' (periodized data), 'series' (keys
+        of the series of perd) and 'fingerprints' (keys of all series and
+        fingerprints of their raw data), or None if there is no (readable)
+        cache file.
+        """
+        filename = self._filename(start_date)
+        if not os.path.exists(filename):
+            return None
+        try:
+            with open(filename, 'rb') as f:
+                return pickle.load(f)
+        except Exception:
+            print('Warning: Ignoring unreadable cache file {}'.format(
+                filename))
+            return None
+
+    def save(self, start_date, end_date, perd, series, fingerprints):
+        """Store the periodized data *perd* for the period of interest from
+        *start_date* to *end_date*, together with the keys of its series
+        *series* and the *fingerprints* of the raw data (see load()),
+        replacing the data cached for *start_date* so far.
+        """
+        os.makedirs(self.dir_name, exist_ok=True)
+        filename = self._filename(start_date)
+        fd, tmp_name = tempfile.mkstemp(dir=self.dir_name, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump({'end_date': end_date, 'perd': perd,
+                             'series': series,
+                             'fingerprints': fingerprints}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_name, filename)
+        except:
+            os.remove(tmp_name)
+            raise
+
+
+def get_cache(cache, default_dir_name=None):
+    """Return a PeriodizedCache object for the argument *cache* of
+    reindex_and_periodize(), which may be a PeriodizedCache object, a
+    directory name, True (use *default_dir_name*), or None/False (no cache;
+    returning None).
+    """
+    if cache is None or cache is False:
+        return None
+    if cache is True:
+        cache = default_dir_name
+    if isinstance(cache, PeriodizedCache):
+        return cache
+    return PeriodizedCache(cache)
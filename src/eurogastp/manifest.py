@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# eurogastp - Python tools for analyzing the European gas system
+#
+# Copyright notice
+# ----------------
+#
+# Copyright (C) 2022 European Union
+#
+# Licensed under the EUPL, Version 1.2 or – as soon they will be approved by
+# the European Commission – subsequent versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# https://joinup.ec.europa.eu/software/page/eupl5
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# Licence for the specific language governing permissions and limitations under
+# the Licence.
+#
+"""Manifest of the API calls made to the ENTSOG and GIE transparency
+platforms, allowing to resume interrupted or partly failed downloads.
+"""
+
+import os
+import json
+import hashlib
+import threading
+import datetime as dt
+
+
+class DownloadManifest:
+    """Record of API calls, kept in a file in JSON lines format (one JSON
+    object per line and API call).
+
+    Every API call is identified by a *key*, a dictionary describing the
+    request (e.g. edge, point directions, year, period and indicators). For
+    every call, a line with the key, the outcome ("ok": data received, "empty":
+    no data available, "failed": no valid response), the HTTP status code, the
+    number of bytes received, the time of the call and the SHA-256 hash of the
+    content is appended to the file. When the manifest is opened again, the
+    last record of every key is taken into account, so that later runs can
+    skip calls that have already been done.
+
+    Parameters:
+
+        filename : path to the manifest file; it is created if it does not
+                   yet exist
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.records = {}
+        self._lock = threading.Lock()
+        if os.path.exists(filename):
+            with open(filename) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        # e.g. last line cut off by an interrupted run
+                        continue
+                    self.records[self._key_str(rec['key'])] = rec
+
+    @staticmethod
+    def _key_str(key):
+        return json.dumps(key, sort_keys=True, default=str)
+
+    def status(self, key):
+        """Return the status of the last record for *key* ("ok", "empty" or
+        "failed"), or None if the API call has never been recorded.
+        """
+        rec = self.records.get(self._key_str(key))
+        return None if rec is None else rec['status']
+
+    def record(self, key, status, http_status=None, content=None):
+        """Add a record for the API call *key* with outcome *status*, the
+        HTTP status code *http_status* and the received *content* (bytes).
+        """
+        rec = {
+            'key': key,
+            'status': status,
+            'http_status': http_status,
+            'bytes': len(content) if content else 0,
+            'timestamp': dt.datetime.now().isoformat(timespec='seconds'),
+            'sha256': hashlib.sha256(content).hexdigest() if content else None,
+            }
+        line = json.dumps(rec, default=str)
+        with self._lock:
+            dir_name = os.path.dirname(self.filename)
+            if dir_name:
+                os.makedirs(dir_name, exist_ok=True)
+            with open(self.filename, 'a') as f:
+                f.write(line + '\n')
+            self.records[self._key_str(key)] = rec
+
+
+def get_manifest(manifest, default_filename=None):
+    """Return a DownloadManifest object for the argument *manifest* of the
+    download functions, which may be a DownloadManifest object, a filename,
+    True (use *default_filename*), or None/False (no manifest; returning
+    None).
+    """
+    if manifest is None or manifest is False:
+        return None
+    if manifest is True:
+        manifest = default_filename
+    if isinstance(manifest, DownloadManifest):
+        return manifest
+    return DownloadManifest(manifest)
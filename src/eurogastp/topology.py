@@ -0,0 +1,414 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# eurogastp - Python tools for analyzing the European gas system
+#
+# Copyright notice
+# ----------------
+#
+# Copyright (C) 2022 European Union
+#
+# Licensed under the EUPL, Version 1.2 or – as soon they will be approved by
+# the European Commission – subsequent versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# https://joinup.ec.europa.eu/software/page/eupl5
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# Licence for the specific language governing permissions and limitations under
+# the Licence.
+#
+"""Indexed topology mapping, allowing to look up the network points, nodes
+and display names of edges without searching the whole topology, and cache
+of the topology file in binary format.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+
+
+class Topology:
+    """Topology mapping (as loaded via entsog.load_topo()) with indexes for
+    the lookups done by the download and aggregation functions.
+
+    The indexes are built once, when the object is created:
+    - edge -> network points (rows of the topology)
+    - node -> rows of the edges starting or ending at the node, and pair of
+      nodes (from_node, to_node) -> rows of the edges between them
+    - network point (operatorKey, pointKey, directionKey) -> edges
+    - edge -> display name
+
+    Where a function of the package accepts a topology DataFrame, a Topology
+    object can be passed instead, saving to search the topology on every
+    call.
+
+    Parameters:
+
+        topo : DataFrame with the topology mapping, as loaded via load_topo()
+    """
+
+    def __init__(self, topo):
+        self.frame = topo
+        edge_names = topo.edge_name.to_numpy()
+
+        # edges in the order of the topology, with the rows of their network
+        # points
+        self.edges = list(pd.unique(edge_names))
+        self._edge_rows = _index(topo, ['edge_name'])
+
+        # rows by node and by pair of nodes
+        self._from_rows = _index(topo, ['from_node'])
+        self._to_rows = _index(topo, ['to_node'])
+        self._pair_rows = _index(topo, ['from_node', 'to_node'])
+
+        # edges by network point
+        self._point_edges = {
+            key: list(pd.unique(edge_names[rows])) for key, rows in
+            _index(topo, ['operatorKey', 'pointKey', 'directionKey']).items()}
+
+        # display names; if an edge has several, the last one is used
+        cols = ['edge_name', 'edge_display_name']
+        self.display_names = dict(topo[cols].drop_duplicates().values.tolist()
+                                  if 'edge_display_name' in topo else [])
+
+    def rows(self, edge):
+        """Return the positions of the rows of the topology (network points)
+        of the edge *edge*, as numpy array; empty if the edge does not exist.
+        """
+        return self._edge_rows.get(edge, np.zeros(0, dtype=np.intp))
+
+    def points(self, edge):
+        """Return the rows of the topology (network points) of the edge
+        *edge*; an empty DataFrame if the edge does not exist.
+        """
+        return self.frame.iloc[self.rows(edge)]
+
+    def point_edges(self, operatorKey, pointKey, directionKey):
+        """Return the list of edges the network point (*operatorKey*,
+        *pointKey*, *directionKey*) is mapped to.
+        """
+        return list(self._point_edges.get(
+            (operatorKey, pointKey, directionKey), []))
+
+    def node_edges(self, from_node=None, to_node=None):
+        """Return the list of edges from *from_node* to *to_node*, in the
+        order of the topology. Both can be a single node or a list of nodes;
+        if one of them is None, any node matches.
+        """
+        if from_node is not None and not _is_iter(from_node):
+            from_node = [from_node]
+        if to_node is not None and not _is_iter(to_node):
+            to_node = [to_node]
+        if from_node is None and to_node is None:
+            return list(self.edges)
+        if to_node is None:
+            rows = [self._from_rows.get(n) for n in set(from_node)]
+        elif from_node is None:
+            rows = [self._to_rows.get(n) for n in set(to_node)]
+        else:
+            rows = [self._pair_rows.get((f, t)) for f in set(from_node)
+                    for t in set(to_node)]
+        rows = [r for r in rows if r is not None]
+        if not rows:
+            return []
+        rows = np.unique(np.concatenate(rows))
+        return list(pd.unique(self.frame.edge_name.to_numpy()[rows]))
+
+    def display_name(self, edge):
+        """Return the display name of the edge *edge* (field
+        "edge_display_name" of the topology); edges without display name are
+        passed through.
+        """
+        name = self.display_names.get(edge, edge)
+        return name if name else edge
+
+
+class Network:
+    """Graph of the target topology: the nodes (from_node, to_node) and the
+    edges between them, with the adjacency of every node.
+
+    Every edge goes from one node to another. If the topology maps an edge
+    to several pairs of nodes, the first one (in the order of the topology)
+    is used.
+
+    Parameters:
+
+        topo : DataFrame with the topology mapping, as loaded via load_topo(),
+               or a Topology object
+
+    Attributes:
+
+        nodes     : list of nodes, in the order of the topology
+        edges     : list of edges, in the order of the topology
+        from_node : numpy array with the position (in nodes) of the start
+                    node of every edge
+        to_node   : numpy array with the position (in nodes) of the end node
+                    of every edge
+    """
+
+    def __init__(self, topo):
+        topo = get_topology(topo)
+        self.edges = list(topo.edges)
+        first = np.array([topo.rows(edge)[0] for edge in self.edges],
+                         dtype=np.intp)
+        from_nodes = topo.frame.from_node.to_numpy()[first]
+        to_nodes = topo.frame.to_node.to_numpy()[first]
+        self.nodes = list(pd.unique(np.column_stack(
+            [from_nodes, to_nodes]).ravel()))
+        node_index = pd.Index(self.nodes)
+        self.from_node = node_index.get_indexer(from_nodes)
+        self.to_node = node_index.get_indexer(to_nodes)
+
+        # adjacency: outgoing and incoming edges of every node
+        self._out_edges = {node: [] for node in self.nodes}
+        self._in_edges = {node: [] for node in self.nodes}
+        for edge, from_node, to_node in zip(self.edges, from_nodes,
+                                            to_nodes):
+            self._out_edges[from_node].append(edge)
+            self._in_edges[to_node].append(edge)
+        self._edge_nodes = dict(zip(self.edges, zip(from_nodes, to_nodes)))
+
+    def edge_nodes(self, edge):
+        """Return the pair of nodes (from_node, to_node) of the edge *edge*.
+        """
+        return self._edge_nodes[edge]
+
+    def out_edges(self, node):
+        """Return the list of edges starting at the node *node* (exits)."""
+        return list(self._out_edges.get(node, []))
+
+    def in_edges(self, node):
+        """Return the list of edges ending at the node *node* (entries)."""
+        return list(self._in_edges.get(node, []))
+
+    def successors(self, node):
+        """Return the list of nodes reached by the edges starting at *node*.
+        """
+        return list(pd.unique(np.array(
+            [self._edge_nodes[e][1] for e in self.out_edges(node)],
+            dtype=object)))
+
+    def predecessors(self, node):
+        """Return the list of nodes with edges ending at *node*."""
+        return list(pd.unique(np.array(
+            [self._edge_nodes[e][0] for e in self.in_edges(node)],
+            dtype=object)))
+
+
+def _index(topo, cols):
+    # Map every key of the columns cols of the topology (skipping keys with
+    # NaN) to the positions of its rows.
+    keys = [topo[c].to_numpy() for c in cols]
+    rows = pd.Series(np.arange(len(topo)))
+    return rows.groupby(keys if len(keys) > 1 else keys[0],
+                        sort=False).indices
+
+
+def _is_iter(obj):
+    return not isinstance(obj, str) and hasattr(obj, '__iter__')
+
+
+# Topology objects built by get_topology() for the last few DataFrames, by
+# id of the DataFrame (which the Topology object keeps alive), so that the
+# functions taking a topology DataFrame do not build the indexes on every
+# call
+_topologies = OrderedDict()
+_max_topologies = 4
+
+# columns of the topology DataFrame the indexes of Topology are built from
+_indexed_columns = ['edge_name', 'edge_display_name', 'from_node', 'to_node',
+                    'operatorKey', 'pointKey', 'directionKey']
+
+
+def _frame_key(topo):
+    """Return a key of the columns of the topology DataFrame *topo* indexed
+    by Topology that changes whenever they are changed (also in place). For
+    columns of type object (as loaded by load_topo()), these are the
+    references to the values rather than the values themselves, which are
+    compared much faster; assigning a value stores another reference.
+    """
+    cols = [col for col in _indexed_columns if col in topo.columns]
+    return (tuple(topo.columns), topo.shape,
+            topo[cols].to_numpy(dtype=object).tobytes())
+
+
+def get_topology(topo):
+    """Return a Topology object for the argument *topo* of the functions
+    taking a topology, which may be a Topology object or a DataFrame as
+    loaded via load_topo(). For a DataFrame, the Topology object is kept and
+    returned again on the next calls with the same, unchanged DataFrame.
+    """
+    if isinstance(topo, Topology):
+        return topo
+    key = _frame_key(topo)
+    entry = _topologies.get(id(topo))
+    if entry is not None and entry[0] == key and entry[1].frame is topo:
+        _topologies.move_to_end(id(topo))
+        return entry[1]
+    topology = Topology(topo)
+    _topologies[id(topo)] = (key, topology)
+    _topologies.move_to_end(id(topo))
+    while len(_topologies) > _max_topologies:
+        _topologies.popitem(last=False)
+    return topology
+
+
+# version of the format of the topology cache files; files written with
+# another version are ignored
+_cache_version = 1
+
+
+def cache_filename(topo_file):
+    """Return the name of the cache file of the topology file *topo_file*,
+    which is kept next to it.
+    """
+    return os.path.splitext(topo_file)[0] + '.cache.parquet'
+
+
+def read_topo_cache(topo_file, sheets):
+    """Return the topology mapping of the sheets *sheets* of the topology file
+    *topo_file* from its cache file (Parquet, see write_topo_cache()). Returns
+    None if there is no valid cache: if it does not exist, was written for
+    other sheets, or the topology file has changed since (different
+    modification time and SHA-256 hash), or if pyarrow is not installed.
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        return None
+    filename = cache_filename(topo_file)
+    if not os.path.exists(filename):
+        return None
+    try:
+        meta = pq.read_schema(filename).metadata or {}
+        meta = json.loads(meta.get(b'eurogastp', b'{}'))
+        if (meta.get('version') != _cache_version or
+                meta.get('sheets') != list(sheets)):
+            return None
+        stat = os.stat(topo_file)
+        if ((meta['mtime_ns'], meta['size']) !=
+                (stat.st_mtime_ns, stat.st_size) and
+                meta['sha256'] != _file_hash(topo_file)):
+            return None
+        table = pq.read_table(filename)
+    except (OSError, ValueError, KeyError):
+        return None
+    return _decode(table.to_pandas(), meta)
+
+
+def write_topo_cache(topo_file, sheets, topo):
+    """Write the topology mapping *topo* of the sheets *sheets* of the
+    topology file *topo_file* to its cache file, together with the
+    modification time and SHA-256 hash of the topology file. Returns True if
+    the cache was written; False if pyarrow is not installed, the topology
+    cannot be stored in Parquet format or the file cannot be written (e.g.
+    read-only directory).
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        return False
+    filename = cache_filename(topo_file)
+    tmp_name = None
+    try:
+        df, meta = _encode(topo)
+        stat = os.stat(topo_file)
+        meta.update(version=_cache_version, sheets=list(sheets),
+                    mtime_ns=stat.st_mtime_ns, size=stat.st_size,
+                    sha256=_file_hash(topo_file))
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata(
+            {**(table.schema.metadata or {}),
+             b'eurogastp': json.dumps(meta).encode()})
+        
+        # write to a temporary file first, so that other processes never
+        # read a partially written cache
+        fd, tmp_name = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(filename)), suffix='.tmp')
+        os.close(fd)
+        pq.write_table(table, tmp_name)
+        os.replace(tmp_name, filename)
+    except (OSError, ValueError, TypeError, pa.ArrowException):
+        if tmp_name is not None and os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        return False
+    return True
+
+
+def _file_hash(filename):
+    sha = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _encode(topo):
+    # Convert the topology to a DataFrame that can be stored in Parquet
+    # format: the index levels become columns, and the columns of type object
+    # (mixing str, int and float values, e.g. "sum" and 0 in the indicator
+    # columns) are split into one column per type, so that the values can be
+    # restored with their original types.
+    if not all(isinstance(c, str) for c in topo.columns):
+        raise ValueError('column names of the topology must be strings')
+    n = len(topo)
+    cols = OrderedDict()
+    index = topo.index.to_frame(index=False)
+    for i, c in enumerate(index):
+        cols['index|{}'.format(i)] = index[c].to_numpy()
+    objects = []
+    for c in topo:
+        values = topo[c].to_numpy()
+        if values.dtype != object:
+            cols[c] = values
+            continue
+        objects.append(c)
+        kinds = [type(v) for v in values]
+        is_str = np.array([issubclass(k, str) for k in kinds], dtype=bool)
+        is_int = np.array([issubclass(k, (int, np.integer)) and
+                           not issubclass(k, (bool, np.bool_))
+                           for k in kinds], dtype=bool)
+        is_float = np.array([issubclass(k, (float, np.floating))
+                             for k in kinds], dtype=bool)
+        if not (is_str | is_int | is_float).all():
+            raise ValueError('column {} of the topology holds values that '
+                             'cannot be cached'.format(c))
+        cols[c + '|str'] = np.where(is_str, values, None)
+        cols[c + '|int'] = pd.array(np.where(is_int, values, None),
+                                    dtype='Int64')
+        cols[c + '|float'] = np.where(is_float, values, np.nan).astype(float)
+    meta = {'columns': list(topo.columns), 'objects': objects,
+            'index_names': list(topo.index.names)}
+    return pd.DataFrame(cols, index=np.arange(n)), meta
+
+
+def _decode(df, meta):
+    # Restore the topology from a DataFrame made by _encode().
+    n = len(df)
+    index_cols = [c for c in df if c.startswith('index|')]
+    index = pd.MultiIndex.from_frame(df[index_cols],
+                                     names=meta['index_names'])
+    if index.nlevels == 1:
+        index = index.get_level_values(0)
+    cols = OrderedDict()
+    for c in meta['columns']:
+        if c not in meta['objects']:
+            cols[c] = df[c].to_numpy()
+            continue
+        values = np.full(n, np.nan, dtype=object)
+        for kind in ['float', 'int', 'str']:
+            part = df[c + '|' + kind]
+            mask = part.notna().to_numpy()
+            values[mask] = part[mask].to_numpy()
+        cols[c] = values
+    return pd.DataFrame(cols, index=index)
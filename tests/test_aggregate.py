@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# eurogastp - Python tools for analyzing the European gas system
+#
+# Copyright notice
+# ----------------
+#
+# Copyright (C) 2022 European Union
+#
+# Licensed under the EUPL, Version 1.2 or – as soon they will be approved by
+# the European Commission – subsequent versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# https://joinup.ec.europa.eu/software/page/eupl5
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# Licence for the specific language governing permissions and limitations under
+# the Licence.
+#
+"""Regression tests for AggregationPlan and select_and_aggregate(),
+comparing them with the former implementation that aggregated edge by edge
+(frozen copy below), and tests of aggregate_groups() and node_balance()
+against straightforward per-group and per-node sums.
+"""
+
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from eurogastp import entsog
+from eurogastp.topology import Topology
+
+from test_reindex import _random_raw
+
+
+# ---------------------------------------------------------------------------
+# frozen copy of the former per-edge implementation (eurogastp 0.1.3)
+
+def _old_select_and_aggregate(edges, topo, df, indicator, quiet=False):
+    col_name = entsog.ind_col_map.get(indicator, indicator)
+    col_ind_map = {y: x for x, y in entsog.ind_col_map.items()}
+    ind_name = col_ind_map.get(indicator, indicator)
+    dfi = df[df.indicator == ind_name].reset_index()
+    if not entsog._is_iter(edges):
+        edges = [edges]
+    vals = []
+    for edge in edges:
+        edges2 = topo[(topo.edge_name == edge) &
+                      (topo[col_name] != 0)]
+        if edges2[col_name].isna().sum():
+            raise(ValueError('Check topology file, there are NaNs in the ' +
+                             'column for indicator {}. '.format(indicator) +
+                             'Need to make a decision of how to use the ' +
+                             'data'))
+        if 1 in edges2[col_name].values:
+            if (edges2[col_name] == 1).sum() > 1:
+                raise(ValueError('There is more than one number 1 for edge ' +
+                                 '{} for indicator {}'.format(edge, indicator)))
+            edges2 = edges2[edges2[col_name] == 1]
+            strategy = "take"
+        elif len(edges2[col_name]) == 0:
+            strategy = "ignore"
+        else:
+            if len(edges2[col_name].unique()) > 1:
+                raise(ValueError('There is more than one aggregation ' +
+                                 'strategy used for edge ' +
+                                 '{} for indicator {}'.format(edge,
+                                                              indicator)))
+            strategy = edges2[col_name].unique()[0]
+
+        dfs = [dfi[(dfi.pointKey == e.pointKey) &
+                   (dfi.operatorKey == e.operatorKey) &
+                   (dfi.directionKey == e.directionKey)]
+               for e in edges2.itertuples()]
+        dfs = pd.concat(dfs) if dfs else pd.DataFrame()
+
+        if len(dfs):
+            if strategy == "take":
+                val = dfs[['date', 'value']].set_index('date')
+            elif strategy == "sum":
+                val = dfs.groupby('date').value.sum()
+            elif strategy in ["av", "mean"]:
+                val = dfs.groupby('date').value.mean()
+            elif strategy == "min":
+                val = dfs.groupby('date').value.min()
+            elif strategy == "max":
+                val = dfs.groupby('date').value.max()
+            else:
+                raise(ValueError('Unknown aggregation strategy: ' +
+                                 '{} (in edge {})'.format(strategy, edge)))
+
+            dfv = pd.DataFrame(val).reset_index()
+            dfv['edge'] = edge
+            vals.append(dfv)
+        else:
+            if not quiet:
+                print('Warning: The edge {} '.format(edge) +
+                      'was not found in the dataset')
+
+    if vals:
+        ind = pd.concat(vals)
+    else:
+        ind = pd.DataFrame(columns=['edge', 'date', 'value'])
+    ind = ind.reset_index(drop=True).set_index(['date', 'edge']).unstack()
+    ind.columns = ind.columns.get_level_values(1)
+    return ind
+
+
+# ---------------------------------------------------------------------------
+# test data
+
+start_date, end_date = dt.date(2021, 12, 25), dt.date(2022, 2, 10)
+
+# edges (name, from_node, to_node) and their aggregation strategies for the
+# indicators Physical Flow and Firm Booked (1: take the first network point)
+edge_nodes = [('NO-DE', 'NO', 'DE'), ('RU-DE', 'RU', 'DE'),
+              ('DZ-ES', 'DZ', 'ES'), ('UA-SK', 'UA', 'SK'),
+              ('DE-FR', 'DE', 'FR'), ('FR-ES', 'FR', 'ES'),
+              ('DE-AT', 'DE', 'AT')]
+strategies = {'flow': ['sum', 1, 'av', 'max', 'min', 'sum', 'mean'],
+              'firmbooked': ['min', 'sum', 'max', 1, 'sum', 0, 'av']}
+
+def _perd(categorical=False):
+    raw = _random_raw(0)
+    if categorical:
+        raw = entsog._categorize(raw)
+    return entsog.reindex_and_periodize(raw, start_date, end_date)
+
+def _row(e, point, first):
+    name, from_node, to_node = edge_nodes[e]
+    row = {'edge_name': name, 'edge_display_name': name.replace('-', '→'),
+           'from_node': from_node, 'to_node': to_node,
+           'operatorKey': point[0], 'pointKey': point[1],
+           'directionKey': point[2]}
+    for col, strats in strategies.items():
+        # only the first network point of an edge is taken
+        row[col] = 'sum' if strats[e] == 1 and not first else strats[e]
+    return row
+
+def _topo():
+    # the network points of the test data, spread over the edges; one
+    # point is part of two edges, and edge FR-ES has one without data
+    keys = ['operatorKey', 'pointKey', 'directionKey']
+    points = _random_raw(0)[keys].drop_duplicates().sort_values(keys)
+    points = list(points.itertuples(index=False))
+    rows = [_row(i % len(edge_nodes), point, i < len(edge_nodes))
+            for i, point in enumerate(points)]
+    rows.append(_row(6, points[0], False))
+    rows.append(_row(5, ('OPX', 'PTX', 'entry'), False))
+    return pd.DataFrame(rows, dtype=object)
+
+edges = [name for name, _, _ in edge_nodes]
+
+
+# ---------------------------------------------------------------------------
+# tests
+
+@pytest.mark.parametrize('indicator', ['Physical Flow', 'firmbooked'])
+@pytest.mark.parametrize('categorical', [False, True])
+def test_single_indicator(indicator, categorical, capsys):
+    perd = _perd(categorical)
+    topo = _topo()
+    expected = _old_select_and_aggregate(edges, topo, perd, indicator)
+    warnings = capsys.readouterr().out
+
+    result = entsog.select_and_aggregate(edges, topo, perd, indicator)
+    assert capsys.readouterr().out == warnings
+    pd.testing.assert_frame_equal(result, expected, check_exact=True)
+    plan = entsog.AggregationPlan(Topology(topo), indicator, edges)
+    for _ in range(2):
+        pd.testing.assert_frame_equal(plan.apply(perd, quiet=True),
+                                      expected, check_exact=True)
+
+    for edge in ['RU-DE', ['DE-AT', 'NO-DE']]:
+        pd.testing.assert_frame_equal(
+                entsog.select_and_aggregate(edge, topo, perd, indicator),
+                _old_select_and_aggregate(edge, topo, perd, indicator),
+                check_exact=True)
+
+def test_batch():
+    perd = _perd(True)
+    topo = _topo()
+    indicators = ['flow', 'Firm Booked']
+    expected = pd.concat(
+            {ind: _old_select_and_aggregate(edges, topo, perd, ind,
+                                            quiet=True)
+             for ind in indicators}, axis=1, names=['indicator', 'edge'])
+    result = entsog.select_and_aggregate(edges, topo, perd, indicators,
+                                         quiet=True)
+    pd.testing.assert_frame_equal(result, expected, check_exact=True)
+
+@pytest.mark.parametrize('indicator', ['flow', ['flow', 'Firm Booked']])
+@pytest.mark.parametrize('categorical', [False, True])
+def test_indexed(indicator, categorical):
+    perd = _perd(categorical)
+    topo = _topo()
+    expected = entsog.select_and_aggregate(edges, topo, perd, indicator,
+                                           quiet=True)
+    result = entsog.select_and_aggregate(edges, topo,
+                                         entsog.index_data(perd), indicator,
+                                         quiet=True)
+    pd.testing.assert_frame_equal(result, expected, check_exact=True)
+
+@pytest.mark.parametrize('dense', [False, True])
+def test_aggregate_groups(dense):
+    perd = _perd(True)
+    topo = _topo()
+    if dense:
+        # in dense format, the sum over series without any value on a day
+        # is NaN, as when aggregating only the values that are not NaN
+        data = entsog.reindex_and_periodize(_random_raw(0), start_date,
+                                            end_date, dense=True)
+        perd = perd[perd.value.notna()]
+    else:
+        data = perd
+    edge_data = _old_select_and_aggregate(edges, topo, perd, 'flow',
+                                          quiet=True)
+    if dense:
+        plan = entsog.AggregationPlan(topo, 'flow', edges)
+        result = plan.aggregate_dense(data)
+        assert list(result.columns) == edges
+        expected = edge_data.reindex(index=result.index, columns=edges)
+        pd.testing.assert_frame_equal(result, expected, rtol=1e-12,
+                                      check_names=False, check_freq=False)
+
+    groups = {'north': ['NO-DE', 'RU-DE'], 'south': ['DZ-ES', 'FR-ES'],
+              'other': ['DE-AT', 'unknown']}
+    result = entsog.aggregate_groups(data, topo, 'flow', groups)
+    for group, group_edges in groups.items():
+        cols = [edge for edge in group_edges if edge in edge_data.columns]
+        expected = edge_data[cols].sum(axis=1, min_count=1)
+        np.testing.assert_allclose(result[group].to_numpy(),
+                                   expected.to_numpy(), rtol=1e-12)
+
+    # corridors and routes of the topology
+    result = entsog.aggregate_groups(data, topo)
+    assert list(result.columns.get_level_values(0).unique()) == \
+            ['corridor', 'route']
+    sums = {('corridor', 'North Sea'): ['NO-DE'],
+            ('corridor', 'North Africa'): ['DZ-ES'],
+            ('corridor', 'East'): ['RU-DE', 'UA-SK'],
+            ('route', 'East -> Nord Stream'): ['RU-DE'],
+            ('route', 'East -> Ukraine'): ['UA-SK']}
+    for group, group_edges in sums.items():
+        expected = edge_data[group_edges].sum(axis=1, min_count=1)
+        np.testing.assert_allclose(result[group].to_numpy(),
+                                   expected.to_numpy(), rtol=1e-12)
+    assert result['corridor', 'UK'].isna().all()
+
+def test_node_balance():
+    perd = _perd(True)
+    topo = _topo()
+    flows = _old_select_and_aggregate(edges, topo, perd, 'flow', quiet=True)
+    flows['unknown'] = 1.
+    result = entsog.node_balance(flows, topo)
+    nodes = sorted({node for _, from_node, to_node in edge_nodes
+                    for node in [from_node, to_node]})
+    assert sorted(result['net'].columns) == nodes
+
+    for node in nodes:
+        entries = [name for name, _, to_node in edge_nodes
+                   if to_node == node and name in flows.columns]
+        exits = [name for name, from_node, _ in edge_nodes
+                 if from_node == node and name in flows.columns]
+        entry = flows[entries].sum(axis=1)
+        exit = flows[exits].sum(axis=1)
+        empty = flows[entries + exits].isna().all(axis=1)
+        for balance, expected in [('entry', entry), ('exit', exit),
+                                  ('net', entry - exit)]:
+            np.testing.assert_allclose(
+                    result[balance, node].to_numpy(),
+                    expected.mask(empty).to_numpy(), rtol=1e-12)
+
+    subset = entsog.node_balance(flows, topo, nodes=['DE', 'ES'])
+    assert list(subset['net'].columns) == ['DE', 'ES']
+    pd.testing.assert_frame_equal(subset, result[subset.columns])
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# eurogastp - Python tools for analyzing the European gas system
+#
+# Copyright notice
+# ----------------
+#
+# Copyright (C) 2022 European Union
+#
+# Licensed under the EUPL, Version 1.2 or – as soon they will be approved by
+# the European Commission – subsequent versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# https://joinup.ec.europa.eu/software/page/eupl5
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# Licence for the specific language governing permissions and limitations under
+# the Licence.
+#
+"""Tests for filter_data() on data indexed by index_data(), comparing the
+search of the sorted index with filtering by a mask.
+"""
+
+import datetime as dt
+
+import pandas as pd
+import pytest
+
+from eurogastp import entsog
+
+from test_reindex import _random_raw
+
+conditions = [
+    {'indicator': 'Physical Flow'},
+    {'indicator': ['Firm Booked', 'Physical Flow'], 'operatorKey': 'OP3'},
+    {'pointKey': ['PT1', 'PT4']},
+    {'operatorKey': ['OP0', 'OP2'], 'directionKey': 'exit'},
+    {'indicator': 'Physical Flow', 'pointKey': 'unknown'},
+    ]
+
+
+@pytest.mark.parametrize('categorical', [False, True])
+@pytest.mark.parametrize('cond', conditions)
+def test_filter_indexed_periodized(cond, categorical, monkeypatch):
+    raw = _random_raw(0)
+    if categorical:
+        raw = entsog._categorize(raw)
+    perd = entsog.reindex_and_periodize(raw, dt.date(2021, 12, 1),
+                                        dt.date(2022, 2, 1))
+    # days before the first record of a series have missing keys
+    assert perd.pointKey.isna().any()
+    indexed = entsog.index_data(perd)
+
+    calls = []
+    index_positions = entsog._index_positions
+    def spy(index, values):
+        calls.append(values)
+        return index_positions(index, values)
+    monkeypatch.setattr(entsog, '_index_positions', spy)
+
+    result = entsog.filter_data(indexed, **cond)
+    assert calls, 'the sorted index was not searched'
+    expected = entsog.index_data(entsog.filter_data(perd, **cond))
+    pd.testing.assert_frame_equal(result, expected, check_index_type=False)
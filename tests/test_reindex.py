@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# eurogastp - Python tools for analyzing the European gas system
+#
+# Copyright notice
+# ----------------
+#
+# Copyright (C) 2022 European Union
+#
+# Licensed under the EUPL, Version 1.2 or – as soon they will be approved by
+# the European Commission – subsequent versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# https://joinup.ec.europa.eu/software/page/eupl5
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# Licence for the specific language governing permissions and limitations under
+# the Licence.
+#
+"""Regression tests for the vectorized reindex_by_period_endtime(),
+periodize() and reindex_and_periodize(), comparing them with the former
+implementation that worked group by group (frozen copy below), and for the
+cache of reindex_and_periodize().
+"""
+
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from eurogastp import entsog
+
+# the former implementation uses pandas features that are deprecated by now
+pytestmark = pytest.mark.filterwarnings('ignore::DeprecationWarning',
+                                        'ignore::FutureWarning')
+
+
+# ---------------------------------------------------------------------------
+# frozen copy of the former per-group implementation (eurogastp 0.1.3)
+
+def _reindex_grp_by_period_endtime(df, start_date, end_date):
+    index = pd.DatetimeIndex(sorted(pd.concat([df.periodFrom,
+                                               df.periodTo]).unique()))
+    df2 = df.sort_values(by=['periodTo', 'lastUpdateDateTime'])
+    df2.drop_duplicates(subset='periodTo', keep='last', inplace=True)
+    df2.set_index('periodTo', inplace=True)
+    fill_keys = ['indicator', 'operatorKey', 'operatorLabel', 'pointKey',
+                 'pointLabel', 'directionKey']
+    df3 = df2.reindex(index=index)
+    df3[fill_keys] = df3[fill_keys].ffill().bfill()
+    df3.index.name = 'periodTo'
+    df5 = df3.reset_index()
+    
+    # cut start
+    length = df5.shape[0]
+    if length > 0:
+        first_date = df5.at[df5.index[0], 'periodTo'].to_pydatetime().date()
+        if length > 1:
+            second_date = \
+                    df5.at[df5.index[1], 'periodTo'].to_pydatetime().date()
+            if start_date > first_date:
+                if start_date < second_date:
+                    delta = start_date - first_date
+                    df5.at[df5.index[0], 'periodTo'] = \
+                            df5.at[df5.index[0], 'periodTo'] + delta
+                else:
+                    df5.at[df5.index[1], 'value'] = np.nan
+                    df5.drop(df5.index[0], inplace=True)
+        else:
+            if start_date > first_date:
+                df5.drop(df5.index[0], inplace=True)
+    
+    # cut end
+    length = df5.shape[0]
+    if length > 0:
+        last_date = df5.at[df5.index[-1], 'periodTo'].to_pydatetime().date()
+        if length > 1:
+            second_last_date = \
+                    df5.at[df5.index[-2], 'periodTo'].to_pydatetime().date()
+            if end_date + dt.timedelta(1) < last_date:
+                if end_date + dt.timedelta(1) > second_last_date:
+                    delta = last_date - (end_date + dt.timedelta(1))
+                    df5.at[df5.index[-1], 'periodTo'] = \
+                            df5.at[df5.index[-1], 'periodTo'] - delta
+                else:
+                    df5.drop(df5.index[-1], inplace=True)
+        else:
+            if end_date + dt.timedelta(1) < last_date:
+                df5.drop(df5.index[-1], inplace=True)
+    
+    df6 = df5.set_index('periodTo')
+    return df6
+
+def _old_reindex_by_period_endtime(raw, start_date, end_date):
+    start_time = pd.Timestamp(start_date)
+    end_time = pd.Timestamp(end_date) + (dt.timedelta(1))
+    df = raw[(raw.periodTo >= start_time) &
+             (raw.periodFrom <= end_time)]
+    grp_keys = ['indicator', 'operatorKey', 'pointKey', 'directionKey']
+    grp = df.groupby(grp_keys, as_index=False, group_keys=False,
+                     observed=True)
+    rexd = grp.apply(_reindex_grp_by_period_endtime,
+                     start_date=start_date, end_date=end_date)
+    rexd.drop('periodFrom', axis=1, inplace=True)
+    return rexd
+
+def _shift_last_row_to_first(a):
+    b = a.copy()
+    b[:-1] = a[1:]
+    b[-1] = a[0]
+    return b
+
+def _periodize_grp2(t, start_date, end_date):
+    t2 = t.copy()
+    t2[['value', 'lastUpdateDateTime']] = \
+            _shift_last_row_to_first(t[['value', 'lastUpdateDateTime']].values)
+    t2.index.name = 'periodFrom'
+    t2['date'] = t.index.normalize()
+    t3 = t2.drop_duplicates(subset='date', keep='last').set_index('date')
+    new_index = pd.date_range(start_date, end_date)
+    new_index.name = 'date'
+    t4 = t3.reindex(new_index, method='ffill')
+    return t4
+
+def _old_periodize(rexd, start_date, end_date):
+    grp_keys = ['indicator', 'operatorKey', 'pointKey', 'directionKey']
+    grp = rexd.groupby(grp_keys, as_index=False, group_keys=False,
+                       observed=True)
+    return grp.apply(_periodize_grp2, start_date=start_date,
+                     end_date=end_date)
+
+
+# ---------------------------------------------------------------------------
+# test data
+
+columns = list(entsog.raw_dtypes)
+
+def _record(ind, frm, to, value, update='2022-03-01 10:00', op='OP1',
+            pt='PT1', direction='entry', label='label'):
+    return (ind, pd.Timestamp(frm), pd.Timestamp(to), op, op + ' label', pt,
+            label, direction, value, pd.Timestamp(update))
+
+def _raw(records):
+    return pd.DataFrame(records, columns=columns)
+
+def _random_raw(seed, ngroups=40):
+    # random point directions with gaps, overlapping and long periods,
+    # revised records, missing labels and missing update times
+    rng = np.random.default_rng(seed)
+    records = []
+    for g in range(ngroups):
+        ind = rng.choice(['Physical Flow', 'Firm Booked'])
+        op, pt = f'OP{g % 7}', f'PT{g % 11}'
+        direction = rng.choice(['entry', 'exit'])
+        t = pd.Timestamp('2021-12-20') + \
+                pd.Timedelta(hours=int(rng.choice([0, 5, 6])))
+        for i in range(rng.integers(1, 30)):
+            step = pd.Timedelta(days=int(rng.choice([1, 1, 1, 2, 5, 40])),
+                                hours=int(rng.choice([0, 0, 0, 1, -1])))
+            gap = pd.Timedelta(days=int(rng.choice([0, 0, 0, 0, 1, 3])))
+            frm = t + gap
+            to = frm + step
+            update = pd.NaT if rng.random() < .05 else \
+                    pd.Timestamp('2022-03-01') + \
+                    pd.Timedelta(minutes=int(rng.integers(0, 5)))
+            label = None if rng.random() < .05 else \
+                    f'L{pt}{rng.integers(0, 2)}'
+            records.append((ind, frm, to, op, f'OL{op}', pt, label,
+                            direction, rng.normal(), update))
+            if rng.random() < .15:
+                # revised record
+                records.append((ind, frm, to, op, f'OL{op}', pt, label,
+                                direction, rng.normal(), update))
+            t = to if rng.random() < .9 else frm
+    df = _raw(records)
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+def _daily(ind='Physical Flow', start='2022-01-01 06:00', days=10, **kwargs):
+    start = pd.Timestamp(start)
+    return [_record(ind, start + pd.Timedelta(days=i),
+                    start + pd.Timedelta(days=i + 1), float(i + 1), **kwargs)
+            for i in range(days)]
+
+cases = {
+    'daily': _daily(),
+    'gap': _daily(days=3) + _daily(start='2022-01-06 06:00', days=3),
+    'overlapping': _daily(days=5) + [
+        _record('Physical Flow', '2022-01-02 06:00', '2022-01-05 06:00', 7.)],
+    'long period': [
+        _record('Physical Flow', '2021-12-01 06:00', '2022-02-01 06:00', 3.)],
+    'long periods around window': _daily(days=2) + [
+        _record('Physical Flow', '2022-01-03 06:00', '2022-03-01 06:00', 3.),
+        _record('Physical Flow', '2021-11-01 06:00', '2022-01-01 06:00', 2.)],
+    'revised': _daily(days=4) + [
+        _record('Physical Flow', '2022-01-02 06:00', '2022-01-03 06:00', 9.,
+                update='2022-03-02 10:00')],
+    'revised, NaT update time': _daily(days=4, update=None) + [
+        _record('Physical Flow', '2022-01-02 06:00', '2022-01-03 06:00', 9.,
+                update=None)],
+    'missing labels': _daily(days=4, label=None)[:2] + _daily(
+            start='2022-01-03 06:00', days=2) + _daily(
+            start='2022-01-05 06:00', days=1, label=None),
+    'gas day change': _daily(days=3) + _daily(start='2022-01-04 05:00',
+                                              days=3),
+    'several series': _daily(days=6) + _daily('Firm Booked', days=4) +
+            _daily(pt='PT2', direction='exit', days=8) +
+            _daily(op='OP2', start='2022-01-03 06:00', days=2),
+    }
+
+windows = [(dt.date(2022, 1, 1), dt.date(2022, 1, 10)),
+           (dt.date(2022, 1, 3), dt.date(2022, 1, 7)),
+           (dt.date(2022, 1, 5), dt.date(2022, 1, 5)),
+           (dt.date(2021, 12, 25), dt.date(2022, 1, 20))]
+
+
+def _check_reindex(raw, start_date, end_date):
+    expected = _old_reindex_by_period_endtime(raw, start_date, end_date)
+    result = entsog.reindex_by_period_endtime(raw, start_date, end_date)
+    if len(expected) == 0:
+        assert len(result) == 0
+        return
+    pd.testing.assert_frame_equal(result, expected, check_exact=True)
+
+def _check_periodize(raw, start_date, end_date):
+    rexd = _old_reindex_by_period_endtime(raw, start_date, end_date)
+    if len(rexd) == 0:
+        assert len(entsog.reindex_and_periodize(raw, start_date,
+                                                end_date)) == 0
+        return
+    expected = _old_periodize(rexd, start_date, end_date)
+    
+    # the former implementation returned the values as objects
+    expected['value'] = expected['value'].astype(float)
+    # (the index of a single group had a frequency, which is not compared)
+    pd.testing.assert_frame_equal(
+            entsog.periodize(rexd, start_date, end_date), expected,
+            check_exact=True, check_freq=False)
+    pd.testing.assert_frame_equal(
+            entsog.reindex_and_periodize(raw, start_date, end_date),
+            expected, check_exact=True, check_freq=False)
+
+
+# ---------------------------------------------------------------------------
+# tests
+
+@pytest.mark.parametrize('window', windows)
+@pytest.mark.parametrize('case', list(cases))
+@pytest.mark.parametrize('categorical', [False, True])
+def test_reindex_cases(case, window, categorical):
+    raw = _raw(cases[case])
+    if categorical:
+        raw = entsog._categorize(raw)
+    _check_reindex(raw, *window)
+
+@pytest.mark.parametrize('window', windows)
+@pytest.mark.parametrize('case', list(cases))
+@pytest.mark.parametrize('categorical', [False, True])
+def test_periodize_cases(case, window, categorical):
+    raw = _raw(cases[case])
+    if categorical:
+        raw = entsog._categorize(raw)
+    _check_periodize(raw, *window)
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('categorical', [False, True])
+def test_reindex_random(seed, categorical):
+    raw = _random_raw(seed)
+    if categorical:
+        raw = entsog._categorize(raw)
+    for window in windows:
+        _check_reindex(raw, *window)
+
+@pytest.mark.parametrize('seed', range(10))
+def test_periodize_random(seed):
+    raw = entsog._categorize(_random_raw(seed))
+    for window in windows:
+        _check_periodize(raw, *window)
+
+@pytest.mark.parametrize('categorical', [False, True])
+def test_empty_selection(categorical):
+    # no period overlaps with the period of interest
+    raw = _raw(_daily())
+    if categorical:
+        raw = entsog._categorize(raw)
+    start_date, end_date = dt.date(2023, 1, 1), dt.date(2023, 1, 31)
+    assert len(entsog.reindex_by_period_endtime(raw, start_date,
+                                                end_date)) == 0
+    assert len(entsog.reindex_and_periodize(raw, start_date, end_date)) == 0
+
+def test_values_bit_identical():
+    raw = entsog._categorize(_random_raw(0))
+    start_date, end_date = windows[3]
+    expected = _old_reindex_by_period_endtime(raw, start_date, end_date)
+    result = entsog.reindex_by_period_endtime(raw, start_date, end_date)
+    assert np.array_equal(result.value.to_numpy().view('i8'),
+                          expected.value.to_numpy().view('i8'))
+
+@pytest.mark.parametrize('seed', range(5))
+def test_cache_growing_window(seed, tmp_path):
+    # daily update: the period of interest ends a few days later each time,
+    # with the data published up to then; the cached results must be the
+    # same as without cache
+    raw = _raw(list(_random_raw(seed).itertuples(index=False)) +
+               _daily(op='OPD', days=60) +
+               _daily('Firm Booked', op='OPD', days=45) +
+               _daily(op='OPD', pt='PT2', start='2022-01-02 05:00', days=60) +
+               _daily(op='OPD', pt='PT3', days=12) +
+               _daily(op='OPD', pt='PT3', start='2022-01-20 06:00', days=30) +
+               _daily(op='OPE', days=20))
+    raw = entsog._categorize(raw)
+    start_date = dt.date(2022, 1, 3)
+    for days in range(5, 40, 3):
+        end_date = start_date + dt.timedelta(days)
+        published = raw[raw.periodFrom < pd.Timestamp(end_date) +
+                        pd.Timedelta(days=1)]
+        for dense in [False, True]:
+            expected = entsog.reindex_and_periodize(published, start_date,
+                                                    end_date, dense=dense)
+            result = entsog.reindex_and_periodize(published, start_date,
+                                                  end_date, dense=dense,
+                                                  cache=tmp_path)
+            pd.testing.assert_frame_equal(result, expected, check_exact=True,
+                                          check_freq=False)
+
+def test_cache_other_columns(tmp_path):
+    # raw data loaded with other columns (e.g. load_raw_file(columns=...))
+    # than the cached data: the cache is not used
+    raw = entsog._categorize(_random_raw(1))
+    start_date, end_date = windows[0]
+    entsog.reindex_and_periodize(raw, start_date, end_date, cache=tmp_path)
+    raw = raw.drop(columns='operatorLabel')
+    for end in [end_date, end_date + dt.timedelta(3)]:
+        expected = entsog.reindex_and_periodize(raw, start_date, end)
+        result = entsog.reindex_and_periodize(raw, start_date, end,
+                                              cache=tmp_path)
+        pd.testing.assert_frame_equal(result, expected, check_exact=True,
+                                      check_freq=False)
+
+@pytest.mark.parametrize('start_method', ['fork', 'spawn'])
+@pytest.mark.parametrize('dense', [False, True])
+def test_parallel(start_method, dense, monkeypatch, tmp_path):
+    # with the slices of the data inherited by forked worker processes and
+    # with the shards passed to the workers (other start methods), the
+    # result is the same as the serial one
+    monkeypatch.setattr(entsog.multiprocessing, 'get_start_method',
+                        lambda: start_method)
+    raw = entsog._categorize(_random_raw(2))
+    start_date, end_date = windows[3]
+    expected = entsog.reindex_and_periodize(raw, start_date, end_date,
+                                            dense=dense)
+    result = entsog.reindex_and_periodize(raw, start_date, end_date,
+                                          dense=dense, workers=2)
+    pd.testing.assert_frame_equal(result, expected, check_exact=True,
+                                  check_freq=False)
+    result = entsog.reindex_and_periodize(raw, start_date, end_date,
+                                          dense=dense, workers=2,
+                                          cache=tmp_path)
+    pd.testing.assert_frame_equal(result, expected, check_exact=True,
+                                  check_freq=False)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# eurogastp - Python tools for analyzing the European gas system
+#
+# Copyright notice
+# ----------------
+#
+# Copyright (C) 2022 European Union
+#
+# Licensed under the EUPL, Version 1.2 or – as soon they will be approved by
+# the European Commission – subsequent versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the Licence.
+# You may obtain a copy of the Licence at:
+#
+# https://joinup.ec.europa.eu/software/page/eupl5
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the Licence is distributed on an "AS IS" basis, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# Licence for the specific language governing permissions and limitations under
+# the Licence.
+#
+"""Tests for the Topology objects kept by get_topology() for topology
+DataFrames.
+"""
+
+import pandas as pd
+
+from eurogastp import entsog
+from eurogastp.topology import get_topology
+
+
+def _topo():
+    return pd.DataFrame({
+        'pointKey': ['PT1', 'PT2', 'PT3'],
+        'operatorKey': ['OP1', 'OP1', 'OP2'],
+        'directionKey': ['entry', 'exit', 'entry'],
+        'edge_name': ['AB', 'AB', 'BC'],
+        'edge_display_name': ['A→B', 'A→B', 'B→C'],
+        'from_node': ['A', 'A', 'B'],
+        'to_node': ['B', 'B', 'C'],
+        })
+
+
+def test_topology_kept_for_dataframe():
+    topo = _topo()
+    topology = get_topology(topo)
+    assert get_topology(topo) is topology
+    # another DataFrame with the same data gets its own Topology object
+    assert get_topology(topo.copy()) is not topology
+    assert entsog.filter_nodes(topo, 'A') == ['AB']
+
+
+def test_topology_rebuilt_after_change():
+    topo = _topo()
+    topology = get_topology(topo)
+    topo.loc[2, 'edge_display_name'] = 'B→C (new)'
+    assert get_topology(topo) is not topology
+    assert entsog.get_display_names(['BC'], topo) == ['B→C (new)']
+    topo.loc[2, 'from_node'] = 'A'
+    assert entsog.filter_nodes(topo, 'A') == ['AB', 'BC']
+    topo['to_node'] = ['C', 'C', 'C']
+    assert entsog.filter_nodes(topo, to_node='B') == []